@@ -1,8 +1,21 @@
+import io
+import os
+import hashlib
+from datetime import date
 import streamlit as st
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 import config
 
+# PDF export is optional
+try:
+    from report_generator import generate_compliance_report
+    PDF_AVAILABLE = True
+except ImportError:
+    PDF_AVAILABLE = False
+
 # Page configuration
 st.set_page_config(
     page_title="ESG Fund Screening Dashboard",
@@ -14,6 +27,259 @@ st.set_page_config(
 if 'portfolio_df' not in st.session_state:
     st.session_state['portfolio_df'] = None
 
+# Tier thresholds
+ELITE_THRESHOLD = config.PERCENTILE_THRESHOLDS['elite']
+REVIEW_THRESHOLD = config.PERCENTILE_THRESHOLDS['review']
+# Fixed, ordered tier labels; Status columns are Categoricals over these
+STATUS_LABELS = ['✅ Elite', '⚠️ Review', '❌ Replace']
+# QoQ alert bands: a change above each edge moves a fund into the next label
+ALERT_EDGES = [
+    config.ALERT_THRESHOLDS['minor'],
+    config.ALERT_THRESHOLDS['watchlist'],
+    config.ALERT_THRESHOLDS['deteriorated'],
+]
+ALERT_LABELS = ['✅ Stable/Improved', '🟡 Minor Change', '🟠 Watchlist', '🔴 Deteriorated']
+FLAGGED_ALERT_CODE = ALERT_LABELS.index('🟠 Watchlist')
+
+# Known YCharts column types
+ESG_DTYPES = {
+    'Symbol': str,
+    'Name': str,
+    'Category Name': 'category',
+    'Morningstar Category': 'category',
+    'FI ESG Quant Screen Scoring System': 'float64',
+}
+
+# Bump whenever prepare_universe() output changes so old Parquet sidecars are not reused
+UNIVERSE_CACHE_VERSION = 'universe-v1'
+
+# Columns the quarter-over-quarter comparison reads from a previous quarter's exports
+PREVIOUS_QUARTER_COLUMNS = (
+    'Symbol', 'Category Name', 'Morningstar Category', 'FI ESG Quant Screen Scoring System'
+)
+
+def tier_status(percentiles):
+    """Bucket category percentiles into the ordered Elite / Review / Replace tiers"""
+    return pd.Categorical(
+        np.select(
+            [percentiles <= ELITE_THRESHOLD, percentiles <= REVIEW_THRESHOLD],
+            STATUS_LABELS[:2],
+            default=STATUS_LABELS[2]
+        ),
+        categories=STATUS_LABELS,
+        ordered=True
+    )
+
+def prepare_universe(frames):
+    """Standardize, concatenate and rank YCharts exports within their Morningstar Category"""
+    # Standardize column names
+    for df in frames:
+        df.rename(columns={'Category Name': 'Morningstar Category'}, inplace=True)
+    
+    # A single export is used as-is; concat would only copy it
+    universe = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+    
+    # Categorical category for grouping and filtering
+    if 'Morningstar Category' in universe.columns:
+        universe['Morningstar Category'] = universe['Morningstar Category'].astype('category')
+    
+    if 'FI ESG Quant Screen Scoring System' in universe.columns and 'Morningstar Category' in universe.columns:
+        universe['FI ESG Quant Percentile Screen'] = universe.groupby('Morningstar Category', observed=True)[
+            'FI ESG Quant Screen Scoring System'
+        ].rank(ascending=False, pct=True).mul(100)
+    
+    return universe
+
+@st.cache_data(show_spinner=False, max_entries=config.UPLOAD_CACHE_MAX_ENTRIES, ttl=config.UPLOAD_CACHE_TTL)
+def parse_csv(data, columns=None):
+    """Parse an uploaded CSV, cached on the raw file bytes and optionally limited to columns"""
+    usecols = None
+    if columns is not None:
+        # The pyarrow engine needs explicit names, so intersect with the header first
+        header = pd.read_csv(io.BytesIO(data), nrows=0).columns
+        usecols = [col for col in header if col in columns]
+    
+    try:
+        return pd.read_csv(io.BytesIO(data), engine='pyarrow', usecols=usecols, dtype=ESG_DTYPES)
+    except pd.errors.ParserError:
+        # Ragged rows (e.g. a trailing "Data as of" footer) need the more lenient C parser
+        return pd.read_csv(io.BytesIO(data), usecols=usecols, dtype=ESG_DTYPES)
+
+@st.cache_data(show_spinner=False, max_entries=config.UPLOAD_CACHE_MAX_ENTRIES, ttl=config.UPLOAD_CACHE_TTL)
+def validate_csv(data):
+    """Parse error message for an upload, or None; cached so reruns skip copying the frame"""
+    try:
+        parse_csv(data)
+    except Exception as e:
+        return str(e)
+    return None
+
+def universe_cache_path(file_bytes):
+    """Parquet sidecar path for a set of YCharts exports, keyed by their content hash"""
+    digest = hashlib.sha1(UNIVERSE_CACHE_VERSION.encode())
+    for data in file_bytes:
+        digest.update(hashlib.sha1(data).digest())
+    return os.path.join(config.UNIVERSE_CACHE_DIR, f"{digest.hexdigest()}.parquet")
+
+def prune_universe_cache():
+    """Delete all but the most recently used Parquet sidecars"""
+    try:
+        entries = [entry for entry in os.scandir(config.UNIVERSE_CACHE_DIR) if entry.name.endswith('.parquet')]
+        entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in entries[config.UNIVERSE_CACHE_MAX_FILES:]:
+            os.remove(entry.path)
+    except OSError:
+        # Another session pruned the same file first; the next write retries
+        pass
+
+@st.cache_data(show_spinner=False, max_entries=config.UPLOAD_CACHE_MAX_ENTRIES, ttl=config.UPLOAD_CACHE_TTL)
+def load_universe(file_bytes, columns=None):
+    """Parse and rank a set of YCharts exports, cached on the raw file bytes"""
+    # Reuse the Parquet sidecar from an earlier upload of the same files
+    cache_path = universe_cache_path(file_bytes)
+    if os.path.exists(cache_path):
+        try:
+            read_columns = None
+            if columns is not None:
+                read_columns = [
+                    col for col in pq.read_schema(cache_path).names
+                    if col in columns or col == 'FI ESG Quant Percentile Screen'
+                ]
+            universe = pd.read_parquet(cache_path, columns=read_columns)
+        except (OSError, pa.ArrowException, ValueError):
+            # Truncated or unreadable sidecar; parse the CSVs instead
+            pass
+        else:
+            # Mark as recently used so pruning keeps it
+            try:
+                os.utime(cache_path)
+            except OSError:
+                pass
+            return universe
+    
+    # Same call as validate_csv for full loads, so both hit one cache entry
+    universe = prepare_universe([
+        parse_csv(data) if columns is None else parse_csv(data, columns) for data in file_bytes
+    ])
+    
+    # Only full loads are persisted, so every sidecar can serve any projection
+    if columns is None:
+        # Write then rename so readers never see a partial file
+        tmp_path = f"{cache_path}.tmp"
+        try:
+            os.makedirs(config.UNIVERSE_CACHE_DIR, exist_ok=True)
+            universe.to_parquet(tmp_path, compression='zstd', index=False)
+            os.replace(tmp_path, cache_path)
+            prune_universe_cache()
+        except (OSError, pa.ArrowException, ValueError):
+            # Unwritable cache dir or columns Arrow can't store; skip the sidecar
+            pass
+    
+    return universe
+
+@st.cache_resource(show_spinner=False, max_entries=config.UPLOAD_CACHE_MAX_ENTRIES, ttl=config.UPLOAD_CACHE_TTL)
+def load_symbol_index(file_bytes):
+    """Symbol -> row position lookup for the ranked universe, shared read-only across reruns"""
+    return pd.Index(load_universe(file_bytes)['Symbol'])
+
+@st.cache_data(show_spinner=False, max_entries=config.UPLOAD_CACHE_MAX_ENTRIES, ttl=config.UPLOAD_CACHE_TTL)
+def load_category(file_bytes, category):
+    """Slice one Morningstar Category out of the ranked universe with Status, best percentile first"""
+    universe = load_universe(file_bytes)
+    category_df = universe[universe['Morningstar Category'] == category]
+    
+    # Sort by percentile and assign Status
+    if 'FI ESG Quant Percentile Screen' in category_df.columns:
+        category_df = category_df.sort_values('FI ESG Quant Percentile Screen')
+        category_df = category_df.assign(Status=tier_status(category_df['FI ESG Quant Percentile Screen']))
+    
+    return category_df
+
+@st.cache_data(show_spinner=False, max_entries=config.UPLOAD_CACHE_MAX_ENTRIES, ttl=config.UPLOAD_CACHE_TTL)
+def export_category_csv(file_bytes, category):
+    """CSV bytes for one category's download, cached per upload and category"""
+    return load_category(file_bytes, category).to_csv(index=False).encode()
+
+def hash_frame(df):
+    """Content hash for DataFrame cache keys, computed vectorized instead of by pickling"""
+    digest = hashlib.md5(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    digest.update(str(list(df.columns)).encode())
+    return digest.hexdigest()
+
+@st.cache_data(
+    show_spinner=False, max_entries=config.UPLOAD_CACHE_MAX_ENTRIES, ttl=config.UPLOAD_CACHE_TTL,
+    hash_funcs={pd.DataFrame: hash_frame}
+)
+def build_compliance_report(category_df, category_name, quarter, portfolio_df, report_date):
+    """Render the compliance PDF, cached on its inputs (report_date keeps the printed date current)"""
+    return generate_compliance_report(category_df, category_name, quarter, portfolio_df=portfolio_df)
+
+@st.cache_resource
+def load_methodology_tables():
+    """Static metric tables for the Methodology tab, built once per server process"""
+    env_metrics = pd.DataFrame([
+        {
+            "Metric": "MSCI ESG Environmental Score",
+            "Weight": "20%",
+            "Rationale": "Composite environmental performance. Holistic view of environmental impact."
+        },
+        {
+            "Metric": "ESG Score Environmental Weight",
+            "Weight": "15%",
+            "Rationale": "% of ESG score from environmental factors. Shows fund's environmental prioritization."
+        },
+        {
+            "Metric": "Fund WACI (Carbon Intensity)",
+            "Weight": "20%",
+            "Rationale": "Emissions per revenue. Key metric for Scope 1&2 exposure and climate risk."
+        },
+        {
+            "Metric": "Financed Carbon Emissions",
+            "Weight": "10%",
+            "Rationale": "Total emissions financed per $M. Absolute footprint metric for net-zero alignment."
+        },
+        {
+            "Metric": "Fossil Fuel Reserves",
+            "Weight": "15%",
+            "Rationale": "% portfolio in companies with reserves. Stranded asset risk identifier."
+        }
+    ])
+    
+    qual_metrics = pd.DataFrame([
+        {
+            "Metric": "MSCI ESG Score",
+            "Weight": "5%",
+            "Rationale": "Overall ESG rating. Independent third-party assessment."
+        },
+        {
+            "Metric": "Fund ESG Leaders %",
+            "Weight": "5%",
+            "Rationale": "% in top-rated ESG companies. Concentration in best-in-class."
+        },
+        {
+            "Metric": "MSCI ESG Trend Positive %",
+            "Weight": "5%",
+            "Rationale": "% holdings with improving scores. Captures positive ESG momentum."
+        },
+        {
+            "Metric": "Fund ESG Laggards %",
+            "Weight": "3%",
+            "Rationale": "% in bottom-rated companies. Flags significant ESG risk."
+        },
+        {
+            "Metric": "Controversial Weapons",
+            "Weight": "1%",
+            "Rationale": "Controversial weapons exposure. Zero tolerance approach."
+        },
+        {
+            "Metric": "MSCI ESG Governance Score",
+            "Weight": "1%",
+            "Rationale": "Board quality and governance. Risk management indicator."
+        }
+    ])
+    
+    return env_metrics, qual_metrics
+
 # Create two tabs: Dashboard and Methodology
 tab1, tab2 = st.tabs(["📊 Screening Dashboard", "📖 Methodology"])
 
@@ -57,33 +323,28 @@ with tab1:
 
     # Main content
     if uploaded_files:
-        dfs = []
-        for file in uploaded_files:
-            try:
-                df = pd.read_csv(file)
-                
-                # Standardize column names
-                if 'Category Name' in df.columns:
-                    df.rename(columns={'Category Name': 'Morningstar Category'}, inplace=True)
-                
-                dfs.append(df)
-            except Exception as e:
-                st.error(f"Error loading {file.name}: {e}")
+        all_files = [file.getvalue() for file in uploaded_files]
+        if os.path.exists(universe_cache_path(all_files)):
+            # Already parsed and ranked in an earlier session; the sidecar replaces validation
+            loaded_files = all_files
+        else:
+            loaded_files = []
+            for file, data in zip(uploaded_files, all_files):
+                # Check each export up front so a bad file is reported by name
+                error = validate_csv(data)
+                if error is None:
+                    loaded_files.append(data)
+                else:
+                    st.error(f"Error loading {file.name}: {error}")
         
-        if dfs:
-            combined_df = pd.concat(dfs, ignore_index=True)
+        if loaded_files:
+            universe_bytes = tuple(loaded_files)
             
             # CRITICAL: Calculate category-relative percentiles
-            if 'FI ESG Quant Screen Scoring System' in combined_df.columns and 'Morningstar Category' in combined_df.columns:
-                with st.spinner("Calculating category-relative percentiles..."):
-                    def calculate_category_percentile(group):
-                        """Calculate percentile rank within category"""
-                        group['Category_Percentile'] = group['FI ESG Quant Screen Scoring System'].rank(ascending=False, pct=True) * 100
-                        return group
-                    
-                    combined_df = combined_df.groupby('Morningstar Category', group_keys=False).apply(calculate_category_percentile)
-                    combined_df['FI ESG Quant Percentile Screen'] = combined_df['Category_Percentile']
-                
+            with st.spinner("Calculating category-relative percentiles..."):
+                combined_df = load_universe(universe_bytes)
+            
+            if 'FI ESG Quant Percentile Screen' in combined_df.columns:
                 st.success(f"✅ Loaded {len(combined_df)} funds and calculated category-relative percentiles")
             else:
                 st.warning("⚠️ Could not calculate category percentiles - missing required columns")
@@ -92,7 +353,7 @@ with tab1:
             # Store portfolio data in session if available
             if portfolio_file is not None:
                 try:
-                    portfolio_data = pd.read_csv(portfolio_file)
+                    portfolio_data = parse_csv(portfolio_file.getvalue())
                     st.session_state['portfolio_df'] = portfolio_data
                 except Exception as e:
                     st.error(f"Error loading portfolio file: {e}")
@@ -108,18 +369,16 @@ with tab1:
                     st.subheader("Current Holdings Overview")
                     
                     # Find column names
-                    holding_col = None
-                    weight_col = None
-                    category_col = None
+                    cols_lower = portfolio_df.columns.astype(str).str.lower()
+                    holding_cols = portfolio_df.columns[cols_lower.str.contains('holding', regex=False)]
+                    weight_cols = portfolio_df.columns[cols_lower.str.contains('weight', regex=False)]
+                    category_cols = portfolio_df.columns[
+                        cols_lower.str.contains('category', regex=False) & ~cols_lower.str.contains('global', regex=False)
+                    ]
                     
-                    for col in portfolio_df.columns:
-                        col_lower = str(col).lower()
-                        if 'holding' in col_lower:
-                            holding_col = col
-                        if 'weight' in col_lower:
-                            weight_col = col
-                        if 'category' in col_lower and 'global' not in col_lower:
-                            category_col = col
+                    holding_col = holding_cols[0] if len(holding_cols) else None
+                    weight_col = weight_cols[0] if len(weight_cols) else None
+                    category_col = category_cols[0] if len(category_cols) else None
                     
                     if holding_col:
                         display_cols = [col for col in [holding_col, weight_col, category_col] if col]
@@ -131,10 +390,11 @@ with tab1:
                             hide_index=True
                         )
                         
-                        current_tickers = portfolio_clean[holding_col].dropna().unique()
-                        screening_tickers = combined_df['Symbol'].unique() if 'Symbol' in combined_df.columns else []
+                        current_tickers = pd.Index(portfolio_clean[holding_col].dropna().unique())
                         
-                        matches = set(current_tickers) & set(screening_tickers)
+                        # The cached Symbol index serves both the overlap and the row lookup below
+                        symbol_index = load_symbol_index(universe_bytes) if 'Symbol' in combined_df.columns else pd.Index([])
+                        matches = current_tickers.intersection(symbol_index)
                         
                         col1, col2 = st.columns(2)
                         col1.metric("Total Holdings", len(current_tickers))
@@ -146,15 +406,13 @@ with tab1:
                             holdings_cols = ['Symbol', 'Name', 'Morningstar Category', 'FI ESG Quant Percentile Screen']
                             holdings_cols = [col for col in holdings_cols if col in combined_df.columns]
                             
-                            holdings_status = combined_df[combined_df['Symbol'].isin(current_tickers)][holdings_cols].copy()
+                            # Hash-probe the Symbol index instead of scanning the whole universe
+                            holdings_status = combined_df.iloc[symbol_index.get_indexer_for(matches)][holdings_cols]
                             
                             if 'FI ESG Quant Percentile Screen' in holdings_status.columns:
-                                holdings_status['Status'] = holdings_status['FI ESG Quant Percentile Screen'].apply(
-                                    lambda x: '✅ Elite' if x <= config.PERCENTILE_THRESHOLDS['elite'] else 
-                                             '⚠️ Review' if x <= config.PERCENTILE_THRESHOLDS['review'] else 
-                                             '❌ Replace'
-                                )
-                                holdings_status = holdings_status.sort_values('FI ESG Quant Percentile Screen')
+                                holdings_status = holdings_status.assign(
+                                    Status=tier_status(holdings_status['FI ESG Quant Percentile Screen'])
+                                ).sort_values('FI ESG Quant Percentile Screen')
                             
                             st.dataframe(holdings_status, use_container_width=True, hide_index=True)
                     else:
@@ -170,43 +428,52 @@ with tab1:
                 st.header("📈 Quarter-over-Quarter Changes")
                 
                 try:
-                    prev_dfs = [pd.read_csv(f) for f in previous_files]
-                    prev_combined = pd.concat(prev_dfs, ignore_index=True)
-                    
-                    # Standardize previous quarter columns
-                    if 'Category Name' in prev_combined.columns:
-                        prev_combined.rename(columns={'Category Name': 'Morningstar Category'}, inplace=True)
-                    
-                    # Calculate category percentiles for previous quarter
-                    if 'FI ESG Quant Screen Scoring System' in prev_combined.columns and 'Morningstar Category' in prev_combined.columns:
-                        def calc_prev_percentile(group):
-                            group['Category_Percentile'] = group['FI ESG Quant Screen Scoring System'].rank(ascending=False, pct=True) * 100
-                            return group
-                        
-                        prev_combined = prev_combined.groupby('Morningstar Category', group_keys=False).apply(calc_prev_percentile)
-                        prev_combined['FI ESG Quant Percentile Screen'] = prev_combined['Category_Percentile']
+                    # Standardize and rank previous quarter through the same pipeline
+                    prev_combined = load_universe(
+                        tuple(f.getvalue() for f in previous_files),
+                        PREVIOUS_QUARTER_COLUMNS
+                    )
                     
                     if 'Symbol' in combined_df.columns and 'Symbol' in prev_combined.columns:
-                        comparison = combined_df.merge(
-                            prev_combined[['Symbol', 'FI ESG Quant Percentile Screen']],
-                            on='Symbol',
-                            how='inner',
-                            suffixes=('_current', '_previous')
-                        )
+                        # Join only what the alert table shows
+                        current_cols = [
+                            col for col in ('Symbol', 'Name', 'FI ESG Quant Percentile Screen')
+                            if col in combined_df.columns
+                        ]
+                        current = combined_df[current_cols]
+                        previous = prev_combined[['Symbol', 'FI ESG Quant Percentile Screen']]
                         
-                        comparison['Percentile_Change'] = (
-                            comparison['FI ESG Quant Percentile Screen_current'] - 
-                            comparison['FI ESG Quant Percentile Screen_previous']
+                        # Tickers listed in several exports are compared once, using the first export's row
+                        duplicated = pd.Index(current['Symbol'][current['Symbol'].duplicated()]).union(
+                            previous['Symbol'][previous['Symbol'].duplicated()]
                         )
+                        if len(duplicated) > 0:
+                            shown = ', '.join(map(str, duplicated[:10])) + (', ...' if len(duplicated) > 10 else '')
+                            st.warning(
+                                f"⚠️ {len(duplicated)} tickers appear in more than one export of a quarter and are "
+                                f"compared once, using the row from the first uploaded export that lists them: {shown}"
+                            )
                         
-                        comparison['Alert'] = comparison['Percentile_Change'].apply(
-                            lambda x: '🔴 Deteriorated' if x > 25 else 
-                                     '🟠 Watchlist' if x > 15 else 
-                                     '🟡 Minor Change' if x > 5 else 
-                                     '✅ Stable/Improved'
+                        comparison = current.drop_duplicates('Symbol').set_index('Symbol').join(
+                            previous.drop_duplicates('Symbol').set_index('Symbol')['FI ESG Quant Percentile Screen'],
+                            how='inner',
+                            lsuffix='_current',
+                            rsuffix='_previous'
+                        ).reset_index()
+                        
+                        # Percentile change and alert band
+                        change = (
+                            comparison['FI ESG Quant Percentile Screen_current'].to_numpy() - 
+                            comparison['FI ESG Quant Percentile Screen_previous'].to_numpy()
                         )
+                        alert_codes = np.searchsorted(ALERT_EDGES, change, side='left').astype(np.uint8)
+                        alert_codes[np.isnan(change)] = 0
+                        flagged = alert_codes >= FLAGGED_ALERT_CODE
                         
-                        alerts = comparison[comparison['Alert'].isin(['🔴 Deteriorated', '🟠 Watchlist'])]
+                        alerts = comparison[flagged].assign(
+                            Percentile_Change=change[flagged],
+                            Alert=pd.Categorical.from_codes(alert_codes[flagged], ALERT_LABELS)
+                        )
                         
                         if len(alerts) > 0:
                             st.warning(f"⚠️ {len(alerts)} funds flagged for attention")
@@ -228,28 +495,21 @@ with tab1:
             
             # Category Analysis
             if 'Morningstar Category' in combined_df.columns:
-                categories = combined_df['Morningstar Category'].dropna().unique()
+                categories = combined_df['Morningstar Category'].cat.categories
                 
                 st.header("🎯 Fund Universe by Category")
-                selected_category = st.selectbox("Select Morningstar Category", sorted(categories))
+                selected_category = st.selectbox("Select Morningstar Category", categories)
                 
-                category_df = combined_df[combined_df['Morningstar Category'] == selected_category].copy()
+                category_df = load_category(universe_bytes, selected_category)
                 
                 if 'FI ESG Quant Percentile Screen' in category_df.columns:
-                    category_df = category_df.sort_values('FI ESG Quant Percentile Screen')
-                    
-                    category_df['Status'] = category_df['FI ESG Quant Percentile Screen'].apply(
-                        lambda x: '✅ Elite' if x <= config.PERCENTILE_THRESHOLDS['elite'] else 
-                                 '⚠️ Review' if x <= config.PERCENTILE_THRESHOLDS['review'] else 
-                                 '❌ Replace'
-                    )
-                    
                     col1, col2, col3 = st.columns(3)
                     
                     total_count = len(category_df)
-                    elite_count = len(category_df[category_df['Status'] == '✅ Elite'])
-                    review_count = len(category_df[category_df['Status'] == '⚠️ Review'])
-                    replace_count = len(category_df[category_df['Status'] == '❌ Replace'])
+                    status_counts = category_df['Status'].value_counts()
+                    elite_count = status_counts.get('✅ Elite', 0)
+                    review_count = status_counts.get('⚠️ Review', 0)
+                    replace_count = status_counts.get('❌ Replace', 0)
                     
                     col1.metric("Total Funds", total_count)
                     col2.metric("Elite (≤25%ile)", elite_count)
@@ -271,38 +531,28 @@ with tab1:
                     col1, col2 = st.columns(2)
                     
                     with col1:
-                        csv = category_df.to_csv(index=False)
                         st.download_button(
                             label=f"Download {selected_category} Results (CSV)",
-                            data=csv,
+                            data=export_category_csv(universe_bytes, selected_category),
                             file_name=f"{selected_category.replace('/', '_')}_{quarter}.csv",
                             mime="text/csv"
                         )
                     
                     with col2:
                         try:
-                            from report_generator import generate_compliance_report
-                            
-                            if st.button("📄 Generate Compliance Report (PDF)"):
+                            if not PDF_AVAILABLE:
+                                st.info("Install fpdf2 for PDF reports: pip install fpdf2")
+                            elif st.button("📄 Generate Compliance Report (PDF)"):
                                 with st.spinner("Generating PDF report..."):
-                                    # Get portfolio data from session state first, then portfolio_file
-                                    portfolio_data = None
-                                    
-                                    # Try session state first
-                                    if st.session_state['portfolio_df'] is not None:
-                                        portfolio_data = st.session_state['portfolio_df']
-                                    # Fall back to portfolio_file
-                                    elif portfolio_file is not None:
-                                        try:
-                                            portfolio_data = pd.read_csv(portfolio_file)
-                                        except Exception as e:
-                                            st.warning(f"Could not read portfolio file: {e}")
+                                    # Portfolio was already parsed above and kept in session state
+                                    portfolio_data = st.session_state['portfolio_df']
                                     
-                                    pdf_bytes = generate_compliance_report(
+                                    pdf_bytes = build_compliance_report(
                                         category_df, 
                                         selected_category, 
                                         quarter,
-                                        portfolio_df=portfolio_data
+                                        portfolio_data,
+                                        date.today()
                                     )
                                     
                                     st.download_button(
@@ -312,8 +562,6 @@ with tab1:
                                         mime="application/pdf"
                                     )
                                 st.success("✅ PDF generated successfully!")
-                        except ImportError:
-                            st.info("Install fpdf2 for PDF reports: pip install fpdf2")
                         except Exception as e:
                             st.error(f"Error generating PDF: {e}")
                             import traceback
@@ -485,35 +733,9 @@ with tab2:
     # Metric framework
     st.header("📊 ESG Metric Framework")
     
-    st.subheader("Environmental Metrics (70% Total Weight)")
+    env_metrics, qual_metrics = load_methodology_tables()
     
-    env_metrics = pd.DataFrame([
-        {
-            "Metric": "MSCI ESG Environmental Score",
-            "Weight": "20%",
-            "Rationale": "Composite environmental performance. Holistic view of environmental impact."
-        },
-        {
-            "Metric": "ESG Score Environmental Weight",
-            "Weight": "15%",
-            "Rationale": "% of ESG score from environmental factors. Shows fund's environmental prioritization."
-        },
-        {
-            "Metric": "Fund WACI (Carbon Intensity)",
-            "Weight": "20%",
-            "Rationale": "Emissions per revenue. Key metric for Scope 1&2 exposure and climate risk."
-        },
-        {
-            "Metric": "Financed Carbon Emissions",
-            "Weight": "10%",
-            "Rationale": "Total emissions financed per $M. Absolute footprint metric for net-zero alignment."
-        },
-        {
-            "Metric": "Fossil Fuel Reserves",
-            "Weight": "15%",
-            "Rationale": "% portfolio in companies with reserves. Stranded asset risk identifier."
-        }
-    ])
+    st.subheader("Environmental Metrics (70% Total Weight)")
     
     st.dataframe(env_metrics, use_container_width=True, hide_index=True)
     
@@ -528,39 +750,6 @@ with tab2:
     
     st.subheader("ESG Quality & Governance Metrics (30% Total Weight)")
     
-    qual_metrics = pd.DataFrame([
-        {
-            "Metric": "MSCI ESG Score",
-            "Weight": "5%",
-            "Rationale": "Overall ESG rating. Independent third-party assessment."
-        },
-        {
-            "Metric": "Fund ESG Leaders %",
-            "Weight": "5%",
-            "Rationale": "% in top-rated ESG companies. Concentration in best-in-class."
-        },
-        {
-            "Metric": "MSCI ESG Trend Positive %",
-            "Weight": "5%",
-            "Rationale": "% holdings with improving scores. Captures positive ESG momentum."
-        },
-        {
-            "Metric": "Fund ESG Laggards %",
-            "Weight": "3%",
-            "Rationale": "% in bottom-rated companies. Flags significant ESG risk."
-        },
-        {
-            "Metric": "Controversial Weapons",
-            "Weight": "1%",
-            "Rationale": "Controversial weapons exposure. Zero tolerance approach."
-        },
-        {
-            "Metric": "MSCI ESG Governance Score",
-            "Weight": "1%",
-            "Rationale": "Board quality and governance. Risk management indicator."
-        }
-    ])
-    
     st.dataframe(qual_metrics, use_container_width=True, hide_index=True)
     
     st.markdown("---")
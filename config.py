@@ -3,6 +3,8 @@ ESG Quantitative Screening Configuration
 Defines metric weights and qualification thresholds
 """
 
+import os
+
 # ESG Metric Weights (must sum to 1.0)
 METRIC_WEIGHTS = {
     # Environmental Metrics (70% total weight)
@@ -34,4 +36,20 @@ THRESHOLD_DESCRIPTIONS = {
     'elite': 'Top Quartile - Automatic qualification. Best-in-class ESG performance.',
     'review': 'Second Quartile - Requires IC justification. Consider replacement with Elite alternative.',
     'replace': 'Bottom Half - Replace at next rebalancing. Insufficient ESG quality.',
-}
\ No newline at end of file
+}
+
+# Quarter-over-Quarter Alert Thresholds (percentile-point deterioration vs. prior quarter)
+ALERT_THRESHOLDS = {
+    'minor': 5,           # > 5 points worse: Minor change
+    'watchlist': 15,      # > 15 points worse: Watchlist, flagged for attention
+    'deteriorated': 25,   # > 25 points worse: Deteriorated, flagged for attention
+}
+
+# Local directory for Parquet copies of ranked uploads, keyed by file content hash
+# (next to this file, so it does not depend on where streamlit is launched from)
+UNIVERSE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+UNIVERSE_CACHE_MAX_FILES = 20  # most recently used sidecars kept on disk
+
+# Bounds for the per-upload Streamlit caches (parsed files, ranked universes, category slices, PDFs)
+UPLOAD_CACHE_MAX_ENTRIES = 32
+UPLOAD_CACHE_TTL = 60 * 60  # seconds
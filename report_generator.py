@@ -1,7 +1,41 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from fpdf import FPDF
 import pandas as pd
+import numpy as np
 from datetime import datetime
 
+# Status emoji stripped for the PDF fonts
+STATUS_EMOJI = str.maketrans('', '', '✅⚠❌\ufe0f')
+# Tier names checked in order when normalizing a status label
+STATUS_TIERS = ('Elite', 'Review', 'Replace')
+
+# Methodology page metrics
+ENVIRONMENTAL_METRICS = (
+    ('MSCI ESG Environmental Score - 20%', 
+     'Composite environmental score covering carbon, resources, pollution.'),
+    ('ESG Score Environmental Weight - 15%', 
+     'Percentage of ESG score from environmental factors.'),
+    ('Fund WACI (Carbon Intensity) - 20%', 
+     'Emissions per revenue. Key climate transition risk metric.'),
+    ('Financed Carbon Emissions - 10%', 
+     'Total emissions financed. Absolute footprint metric.'),
+    ('Fossil Fuel Reserves - 15%', 
+     'Percentage in companies with reserves. Stranded asset risk.'),
+)
+QUALITY_METRICS = (
+    ('MSCI ESG Score - 5%', 'Overall ESG rating.'),
+    ('Fund ESG Leaders % - 5%', 'Percentage in top-rated companies.'),
+    ('MSCI ESG Trend Positive % - 5%', 'Percentage with improving scores.'),
+    ('Fund ESG Laggards % - 3%', 'Percentage in bottom-rated companies.'),
+    ('Controversial Weapons - 1%', 'Exposure to controversial weapons.'),
+    ('MSCI ESG Governance Score - 1%', 'Board quality and governance.'),
+)
+
+# Column widths (mm) for the holdings and top-10 fund tables
+HOLDINGS_TABLE_WIDTHS = (20, 60, 22, 22, 25, 31)
+TOP_FUNDS_TABLE_WIDTHS = (8, 25, 75, 25, 30, 17)
+
 class ESGComplianceReport(FPDF):
     """Enhanced PDF class for ESG screening reports"""
     
@@ -27,23 +61,52 @@ class ESGComplianceReport(FPDF):
         self.cell(0, 8, title, 0, 1, 'L')
         self.ln(2)
 
+@lru_cache(maxsize=32)
+def _clean_status_label(status):
+    """Strip emoji and normalize one status string; only a handful of labels ever occur"""
+    status = status.translate(STATUS_EMOJI).strip()
+    return next((tier for tier in STATUS_TIERS if tier in status), status)
+
 def clean_status_for_pdf(status):
     """Remove Unicode characters that fpdf can't handle"""
     if not isinstance(status, str):
         return str(status)
     
-    status = status.replace('✅', '').replace('⚠️', '').replace('❌', '').strip()
-    
-    if 'Elite' in status:
-        return 'Elite'
-    elif 'Review' in status:
-        return 'Review'
-    elif 'Replace' in status:
-        return 'Replace'
-    else:
-        return status
+    return _clean_status_label(status)
+
+def table_row(pdf, widths, height, values):
+    """Emit one bordered table row, pairing each value with its column width"""
+    cell = pdf.cell
+    for width, value in zip(widths, values):
+        cell(width, height, value, 1)
+    pdf.ln()
 
-def generate_compliance_report(category_df, category_name, quarter, portfolio_df=None):
+def fund_table_rows(df, ticker_chars, name_chars, status_chars):
+    """Yield (ticker, name, percentile, score, clean status) cell strings per fund, built column-wise"""
+    def column(name, default):
+        return df[name] if name in df.columns else pd.Series(default, index=df.index, dtype=object)
+    
+    def text(series, chars):
+        return series.map(str).str.slice(0, chars).tolist()
+    
+    def number(series, fmt):
+        return np.char.mod(fmt, series.to_numpy(dtype=float)).tolist()
+    
+    return zip(
+        text(column('Symbol', 'N/A'), ticker_chars),
+        text(column('Name', 'N/A'), name_chars),
+        number(column('FI ESG Quant Percentile Screen', 0), '%.1f'),
+        number(column('FI ESG Quant Screen Scoring System', 0), '%.3f'),
+        text(column('Status', '').map(clean_status_for_pdf), status_chars),
+    )
+
+def find_holding_column(portfolio_df):
+    """First portfolio column whose name mentions holding, symbol or ticker, else None"""
+    cols_lower = portfolio_df.columns.astype(str).str.lower()
+    holding_cols = portfolio_df.columns[cols_lower.str.contains('holding|symbol|ticker')]
+    return holding_cols[0] if len(holding_cols) else None
+
+def generate_compliance_report(category_df, category_name, quarter, portfolio_df=None, holding_col=None, out=None):
     """
     Generate enhanced PDF compliance report with portfolio holdings analysis
     
@@ -52,11 +115,21 @@ def generate_compliance_report(category_df, category_name, quarter, portfolio_df
         category_name: String name of Morningstar category
         quarter: String like '2025Q4'
         portfolio_df: Optional DataFrame with current portfolio holdings
+        holding_col: Optional ticker column in portfolio_df; detected from the column names if omitted
+        out: Optional binary file or buffer to write the PDF into
     
     Returns:
-        PDF bytes for download
+        PDF bytes for download, or None when written to out
     """
     
+    # Sort by percentile (best first)
+    if 'FI ESG Quant Percentile Screen' in category_df.columns:
+        category_df = category_df.sort_values('FI ESG Quant Percentile Screen', kind='stable')
+    
+    # Categorical Status for per-label cleaning
+    if 'Status' in category_df.columns and not isinstance(category_df['Status'].dtype, pd.CategoricalDtype):
+        category_df = category_df.assign(Status=category_df['Status'].astype('category'))
+    
     pdf = ESGComplianceReport()
     pdf.add_page()
     
@@ -79,14 +152,10 @@ def generate_compliance_report(category_df, category_name, quarter, portfolio_df
     replace = 0
     
     if 'Status' in category_df.columns:
-        for status in category_df['Status']:
-            clean = clean_status_for_pdf(str(status))
-            if 'Elite' in clean:
-                elite += 1
-            elif 'Review' in clean:
-                review += 1
-            elif 'Replace' in clean:
-                replace += 1
+        status_counts = category_df['Status'].map(clean_status_for_pdf).value_counts()
+        elite = status_counts.get('Elite', 0)
+        review = status_counts.get('Review', 0)
+        replace = status_counts.get('Replace', 0)
     
     pdf.cell(0, 8, f'Total Funds in Universe: {total}', 0, 1)
     if total > 0:
@@ -100,64 +169,46 @@ def generate_compliance_report(category_df, category_name, quarter, portfolio_df
         pdf.section_title('Current Model Holdings in This Category')
         pdf.set_font('Arial', '', 9)
         
-        # Find holding column - try multiple variations
-        holding_col = None
-        for col in portfolio_df.columns:
-            col_lower = str(col).lower()
-            if 'holding' in col_lower or 'symbol' in col_lower or 'ticker' in col_lower:
-                holding_col = col
-                break
+        # Find holding column - first name mentioning holding, symbol or ticker
+        if holding_col is None:
+            holding_col = find_holding_column(portfolio_df)
         
         if holding_col and 'Symbol' in category_df.columns:
             # Get all unique holdings from portfolio
-            all_holdings = portfolio_df[holding_col].dropna().unique()
+            all_holdings_upper = set(portfolio_df[holding_col].dropna().astype(str).str.upper())
             
             # Filter category_df to only holdings (case-insensitive match)
-            all_holdings_upper = [str(h).upper() for h in all_holdings]
-            category_df_upper = category_df.copy()
-            category_df_upper['Symbol_Upper'] = category_df_upper['Symbol'].str.upper()
-            
-            holdings_in_category = category_df_upper[
-                category_df_upper['Symbol_Upper'].isin(all_holdings_upper)
-            ].copy()
+            holdings_in_category = category_df[
+                category_df['Symbol'].str.upper().isin(all_holdings_upper)
+            ]
             
             if len(holdings_in_category) > 0:
-                # Sort by percentile (best first)
-                holdings_in_category = holdings_in_category.sort_values('FI ESG Quant Percentile Screen')
-                
                 pdf.cell(0, 6, f'Total model holdings in {clean_category}: {len(holdings_in_category)}', 0, 1)
                 pdf.ln(3)
                 
                 # Table header
                 pdf.set_font('Arial', 'B', 8)
-                pdf.cell(20, 7, 'Ticker', 1)
-                pdf.cell(60, 7, 'Fund Name', 1)
-                pdf.cell(22, 7, 'Percentile', 1)
-                pdf.cell(22, 7, 'Score', 1)
-                pdf.cell(25, 7, 'Status', 1)
-                pdf.cell(31, 7, 'Category Rank', 1)
-                pdf.ln()
+                table_row(pdf, HOLDINGS_TABLE_WIDTHS, 7,
+                          ('Ticker', 'Fund Name', 'Percentile', 'Score', 'Status', 'Category Rank'))
                 
                 # Holdings data
                 pdf.set_font('Arial', '', 7)
-                for idx, (_, row) in enumerate(holdings_in_category.iterrows(), 1):
-                    ticker = str(row.get('Symbol', 'N/A'))[:8]
-                    fund_name = str(row.get('Name', 'N/A'))[:28]
-                    percentile = row.get('FI ESG Quant Percentile Screen', 0)
-                    score = row.get('FI ESG Quant Screen Scoring System', 0)
-                    status = clean_status_for_pdf(str(row.get('Status', '')))
-                    
-                    # Calculate rank in category
-                    rank = (category_df['FI ESG Quant Percentile Screen'] < percentile).sum() + 1
+                # Calculate rank in category
+                sorted_percentiles = category_df['FI ESG Quant Percentile Screen'].to_numpy()
+                holding_percentiles = holdings_in_category['FI ESG Quant Percentile Screen'].to_numpy()
+                ranks = np.where(
+                    np.isnan(holding_percentiles),
+                    1,
+                    np.searchsorted(sorted_percentiles, holding_percentiles, side='left') + 1
+                )
+                
+                for (ticker, fund_name, percentile, score, status), rank in zip(
+                    fund_table_rows(holdings_in_category, 8, 28, 12), ranks.tolist()
+                ):
                     rank_str = f"#{rank} of {total}"
                     
-                    pdf.cell(20, 7, ticker, 1)
-                    pdf.cell(60, 7, fund_name, 1)
-                    pdf.cell(22, 7, f"{percentile:.1f}", 1)
-                    pdf.cell(22, 7, f"{score:.3f}", 1)
-                    pdf.cell(25, 7, status[:12], 1)
-                    pdf.cell(31, 7, rank_str, 1)
-                    pdf.ln()
+                    table_row(pdf, HOLDINGS_TABLE_WIDTHS, 7,
+                              (ticker, fund_name, percentile, score, status, rank_str))
                 
                 pdf.ln(5)
                 
@@ -166,10 +217,11 @@ def generate_compliance_report(category_df, category_name, quarter, portfolio_df
                 pdf.cell(0, 6, 'Model Holdings Summary:', 0, 1)
                 pdf.set_font('Arial', '', 9)
                 
-                elite_holdings = len(holdings_in_category[holdings_in_category['FI ESG Quant Percentile Screen'] <= 25])
-                review_holdings = len(holdings_in_category[(holdings_in_category['FI ESG Quant Percentile Screen'] > 25) & 
-                                                          (holdings_in_category['FI ESG Quant Percentile Screen'] <= 50)])
-                replace_holdings = len(holdings_in_category[holdings_in_category['FI ESG Quant Percentile Screen'] > 50])
+                # Elite / Review / Replace holdings counts
+                ranked_percentiles = holding_percentiles[~np.isnan(holding_percentiles)]
+                elite_holdings, review_holdings, replace_holdings = np.bincount(
+                    np.searchsorted([25, 50], ranked_percentiles, side='left'), minlength=3
+                ).tolist()
                 
                 pdf.cell(0, 6, f'  Elite holdings: {elite_holdings} (meets standard)', 0, 1)
                 if review_holdings > 0:
@@ -205,30 +257,14 @@ def generate_compliance_report(category_df, category_name, quarter, portfolio_df
     
     # Table header
     pdf.set_font('Arial', 'B', 9)
-    pdf.cell(8, 8, '#', 1)
-    pdf.cell(25, 8, 'Ticker', 1)
-    pdf.cell(75, 8, 'Fund Name', 1)
-    pdf.cell(25, 8, 'Percentile', 1)
-    pdf.cell(30, 8, 'Status', 1)
-    pdf.cell(17, 8, 'Score', 1)
-    pdf.ln()
+    table_row(pdf, TOP_FUNDS_TABLE_WIDTHS, 8, ('#', 'Ticker', 'Fund Name', 'Percentile', 'Status', 'Score'))
     
     # Top 10 funds
     pdf.set_font('Arial', '', 8)
-    for idx, (_, row) in enumerate(category_df.head(10).iterrows(), 1):
-        ticker = str(row.get('Symbol', 'N/A'))[:10]
-        fund_name = str(row.get('Name', 'N/A'))[:35]
-        percentile = row.get('FI ESG Quant Percentile Screen', 0)
-        score = row.get('FI ESG Quant Screen Scoring System', 0)
-        status = clean_status_for_pdf(str(row.get('Status', '')))
-        
-        pdf.cell(8, 8, str(idx), 1)
-        pdf.cell(25, 8, ticker, 1)
-        pdf.cell(75, 8, fund_name, 1)
-        pdf.cell(25, 8, f"{percentile:.1f}", 1)
-        pdf.cell(30, 8, status[:15], 1)
-        pdf.cell(17, 8, f"{score:.3f}", 1)
-        pdf.ln()
+    top_funds = fund_table_rows(category_df.head(10), 10, 35, 15)
+    for idx, (ticker, fund_name, percentile, score, status) in enumerate(top_funds, 1):
+        table_row(pdf, TOP_FUNDS_TABLE_WIDTHS, 8,
+                  (str(idx), ticker, fund_name, percentile, status, score))
     
     # ========== PAGE: Methodology ==========
     pdf.add_page()
@@ -285,20 +321,7 @@ def generate_compliance_report(category_df, category_name, quarter, portfolio_df
     pdf.section_title('Environmental Metrics (70% Total Weight)')
     pdf.set_font('Arial', '', 8)
     
-    metrics = [
-        ('MSCI ESG Environmental Score - 20%', 
-         'Composite environmental score covering carbon, resources, pollution.'),
-        ('ESG Score Environmental Weight - 15%', 
-         'Percentage of ESG score from environmental factors.'),
-        ('Fund WACI (Carbon Intensity) - 20%', 
-         'Emissions per revenue. Key climate transition risk metric.'),
-        ('Financed Carbon Emissions - 10%', 
-         'Total emissions financed. Absolute footprint metric.'),
-        ('Fossil Fuel Reserves - 15%', 
-         'Percentage in companies with reserves. Stranded asset risk.'),
-    ]
-    
-    for metric, description in metrics:
+    for metric, description in ENVIRONMENTAL_METRICS:
         pdf.set_font('Arial', 'B', 9)
         pdf.cell(0, 6, metric, 0, 1)
         pdf.set_font('Arial', '', 8)
@@ -309,16 +332,7 @@ def generate_compliance_report(category_df, category_name, quarter, portfolio_df
     pdf.section_title('ESG Quality Metrics (30% Total Weight)')
     pdf.set_font('Arial', '', 8)
     
-    quality_metrics = [
-        ('MSCI ESG Score - 5%', 'Overall ESG rating.'),
-        ('Fund ESG Leaders % - 5%', 'Percentage in top-rated companies.'),
-        ('MSCI ESG Trend Positive % - 5%', 'Percentage with improving scores.'),
-        ('Fund ESG Laggards % - 3%', 'Percentage in bottom-rated companies.'),
-        ('Controversial Weapons - 1%', 'Exposure to controversial weapons.'),
-        ('MSCI ESG Governance Score - 1%', 'Board quality and governance.'),
-    ]
-    
-    for metric, description in quality_metrics:
+    for metric, description in QUALITY_METRICS:
         pdf.set_font('Arial', 'B', 9)
         pdf.cell(0, 6, metric, 0, 1)
         pdf.set_font('Arial', '', 8)
@@ -334,4 +348,44 @@ def generate_compliance_report(category_df, category_name, quarter, portfolio_df
         'Elite or Replace philosophy: Only <=25th percentile meets standard.'
     )
     
-    return bytes(pdf.output(dest='S'))
\ No newline at end of file
+    # Write to caller's file if given
+    if out is not None:
+        pdf.output(out)
+        return None
+    
+    return bytes(pdf.output())
+
+def _generate_report_job(job):
+    """Process-pool worker: unpack one (category_df, category_name, quarter, portfolio_df, holding_col) job"""
+    category_df, category_name, quarter, portfolio_df, holding_col = job
+    return generate_compliance_report(
+        category_df, category_name, quarter, portfolio_df=portfolio_df, holding_col=holding_col
+    )
+
+def generate_compliance_reports(jobs, max_workers=None, holding_col=None):
+    """
+    Generate several compliance reports in parallel, one worker process per CPU by default
+    
+    Args:
+        jobs: Iterable of (category_df, category_name, quarter, portfolio_df) tuples
+        max_workers: Optional cap on worker processes
+        holding_col: Optional ticker column shared by every portfolio_df; detected once per
+            distinct portfolio if omitted
+    
+    Returns:
+        List of PDF bytes, in the same order as jobs
+    """
+    # id(portfolio_df) -> (portfolio_df, holding column); the frame is kept so its id stays unique
+    portfolio_holding_cols = {}
+    
+    def with_holding_col(job):
+        category_df, category_name, quarter, portfolio_df = job
+        job_holding_col = holding_col
+        if job_holding_col is None and portfolio_df is not None:
+            if id(portfolio_df) not in portfolio_holding_cols:
+                portfolio_holding_cols[id(portfolio_df)] = (portfolio_df, find_holding_column(portfolio_df))
+            job_holding_col = portfolio_holding_cols[id(portfolio_df)][1]
+        return category_df, category_name, quarter, portfolio_df, job_holding_col
+    
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_generate_report_job, map(with_holding_col, jobs)))